@@ -0,0 +1,66 @@
+"""
+Prueba de carga del gateway en modo streamable HTTP.
+Author: Santiago Pernia
+
+Uso:
+    uv run ibmi-gateway --transport http --workers 4
+    uv run scripts/load_test.py --clients 30 --requests 10 --tool list_source_members \
+        --args '{"library": "DEVLIB", "source_file": "QRPGLESRC"}'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+
+async def run_client(url: str, headers: dict, tool: str, arguments: dict, requests: int, latencies: list, errors: list):
+    """Simula un desarrollador: una sesión MCP que llama a la herramienta varias veces."""
+    async with streamablehttp_client(url, headers=headers) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for _ in range(requests):
+                start = time.perf_counter()
+                result = await session.call_tool(tool, arguments)
+                latencies.append(time.perf_counter() - start)
+                text = "".join(c.text for c in result.content if hasattr(c, "text"))
+                if result.isError or text.startswith("Error"):
+                    errors.append(text)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del IBM i Gateway")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/mcp")
+    parser.add_argument("--clients", type=int, default=30, help="Clientes concurrentes")
+    parser.add_argument("--requests", type=int, default=10, help="Llamadas por cliente")
+    parser.add_argument("--tool", default="list_systems")
+    parser.add_argument("--args", default="{}", help="Argumentos de la herramienta en JSON")
+    parser.add_argument("--token", default=os.getenv("IBMI_HTTP_TOKEN"),
+                        help="Token Bearer del gateway (default: IBMI_HTTP_TOKEN)")
+    args = parser.parse_args()
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else None
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(args.url, headers, args.tool, json.loads(args.args), args.requests, latencies, errors)
+        for _ in range(args.clients)
+    ])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"--- {args.tool}: {len(latencies)} llamadas, {args.clients} clientes ---")
+    print(f"Tiempo total: {elapsed:.2f}s ({len(latencies) / elapsed:.1f} llamadas/s)")
+    print(f"Latencia p50: {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"Latencia p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+    print(f"Respuestas con error: {len(errors)}")
+    if errors:
+        print(f"Primer error: {errors[0]}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
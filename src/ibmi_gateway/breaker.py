@@ -0,0 +1,250 @@
+"""
+Circuit breaker por host para fallar rápido ante sistemas IBM i inaccesibles.
+Author: Santiago Pernia
+"""
+
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+import paramiko
+
+# Clases de error de conexión
+ERROR_AUTH = "auth"
+ERROR_NETWORK = "network"
+ERROR_BUSY = "busy"
+ERROR_OTHER = "other"
+
+# Solo los errores transitorios cuentan para abrir el circuito
+TRANSIENT_ERRORS = (ERROR_NETWORK, ERROR_BUSY)
+
+# Fragmentos de mensajes SSH de un host que acepta la conexión pero no responde
+BUSY_MESSAGES = ("banner", "timed out", "timeout", "reset", "transport shut down", "eof")
+
+# Tiempo máximo de espera de un sondeo de recuperación (segundos)
+PROBE_TIMEOUT = 5
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Clasifica un error de conexión SSH.
+
+    Args:
+        error: Excepción lanzada al conectar.
+
+    Returns:
+        ERROR_AUTH si las credenciales o la clave de host son rechazadas,
+        ERROR_NETWORK si el host no es alcanzable, ERROR_BUSY si el host
+        acepta la conexión pero no responde (ej. durante un IPL) y
+        ERROR_OTHER en cualquier otro caso.
+    """
+    if isinstance(error, paramiko.SSHException):
+        # Va antes que la comprobación de credenciales: paramiko informa como
+        # AuthenticationException una autenticación que no responde
+        # ("Authentication timeout.") o que el host corta a mitad
+        # ("transport shut down or saw EOF"), típicos de un IPL
+        message = str(error).lower()
+        if any(token in message for token in BUSY_MESSAGES):
+            return ERROR_BUSY
+    if isinstance(error, (paramiko.AuthenticationException, paramiko.BadHostKeyException)):
+        return ERROR_AUTH
+    if isinstance(error, OSError):
+        return ERROR_NETWORK
+    if isinstance(error, EOFError):
+        return ERROR_BUSY
+    return ERROR_OTHER
+
+
+def ssh_banner_probe(host: str, port: int, timeout: float = PROBE_TIMEOUT) -> None:
+    """
+    Comprueba que el servidor SSH responde enviando su banner.
+
+    Lanza OSError si el host no acepta conexiones o no envía un banner SSH.
+    """
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.settimeout(timeout)
+        banner = sock.recv(256)
+    if not banner.startswith(b"SSH-"):
+        raise OSError(f"Respuesta inesperada del servidor SSH en {host}:{port}")
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuito del host está abierto; la llamada se rechaza sin conectar."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para las conexiones a un host.
+
+    Tras `failure_threshold` fallos transitorios seguidos el circuito se abre
+    y las llamadas fallan al instante. Un hilo en segundo plano sondea el host
+    con backoff exponencial; cuando responde, el circuito pasa a semiabierto
+    y deja pasar una única conexión de prueba que lo cierra o lo reabre.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], None],
+        failure_threshold: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        """
+        Inicializa el circuit breaker.
+
+        Args:
+            name: Identificador del host (para mensajes).
+            probe: Función de sondeo; lanza una excepción si el host sigue caído.
+            failure_threshold: Fallos transitorios seguidos que abren el circuito.
+            base_delay: Espera inicial entre sondeos (segundos).
+            max_delay: Espera máxima entre sondeos (segundos).
+        """
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = self.CLOSED
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._next_probe = 0.0
+        self._trial_in_flight = False
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """
+        Autoriza un intento de conexión.
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto o ya hay una
+                conexión de prueba en curso.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise self._open_error()
+
+    def ensure_available(self) -> None:
+        """
+        Comprueba, sin reservar la conexión de prueba, que se puede intentar conectar.
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto o ya hay una
+                conexión de prueba en curso.
+        """
+        with self._lock:
+            if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._trial_in_flight):
+                raise self._open_error()
+
+    def _open_error(self) -> CircuitOpenError:
+        """Construye el error de circuito abierto (con el lock tomado)."""
+        wait = max(0.0, self._next_probe - time.monotonic())
+        return CircuitOpenError(
+            f"Conexión fallida: {self.name} no disponible (circuito abierto, "
+            f"próximo reintento en {wait:.0f}s). Último error: {self.last_error}"
+        )
+
+    def record_success(self) -> None:
+        """Registra una conexión exitosa y cierra el circuito."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.last_error = None
+            self._trial_in_flight = False
+
+    def record_failure(self, kind: str, message: str = "") -> None:
+        """
+        Registra una conexión fallida.
+
+        Args:
+            kind: Clase del error (ver classify_error).
+            message: Descripción del error.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+            if kind not in TRANSIENT_ERRORS:
+                # Credenciales o configuración: reintentar no lo arregla, pero
+                # el host respondió, así que no cuenta como caída
+                if self.state == self.HALF_OPEN:
+                    self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            self.last_error = message or kind
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self) -> None:
+        """Abre el circuito e inicia el sondeo en segundo plano (con el lock tomado)."""
+        self.state = self.OPEN
+        self._next_probe = time.monotonic() + self.base_delay
+        if not self._probing:
+            self._probing = True
+            threading.Thread(
+                target=self._probe_loop, name=f"ibmi-breaker-{self.name}", daemon=True
+            ).start()
+
+    def _probe_loop(self) -> None:
+        """Sondea el host con backoff exponencial hasta que responda."""
+        delay = self.base_delay
+        while True:
+            with self._lock:
+                if self.state != self.OPEN:
+                    self._probing = False
+                    return
+                wait = max(0.0, self._next_probe - time.monotonic())
+            time.sleep(wait)
+
+            try:
+                self.probe()
+            except Exception as e:
+                delay = min(delay * 2, self.max_delay)
+                with self._lock:
+                    self.last_error = str(e)
+                    self._next_probe = time.monotonic() + delay
+                continue
+
+            with self._lock:
+                if self.state == self.OPEN:
+                    self.state = self.HALF_OPEN
+                    self._trial_in_flight = False
+                self._probing = False
+                return
+
+
+_breakers: Dict[Tuple[str, int], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(
+    host: str,
+    port: int,
+    failure_threshold: int = 3,
+    max_delay: float = 60.0
+) -> CircuitBreaker:
+    """
+    Obtiene el circuit breaker compartido de un host, creándolo si no existe.
+
+    Varios sistemas lógicos que apuntan al mismo host comparten el circuito.
+    """
+    key = (host.lower(), port)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name=f"{host}:{port}",
+                probe=lambda: ssh_banner_probe(host, port),
+                failure_threshold=failure_threshold,
+                max_delay=max_delay
+            )
+            _breakers[key] = breaker
+        return breaker
@@ -0,0 +1,428 @@
+"""
+Broker de conexiones y caché compartido entre procesos del gateway.
+Author: Santiago Pernia
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+from typing import Callable, List, Optional, Tuple
+from .config import BrokerConfig, GatewayConfig
+from .router import TargetRouter
+
+# Variables de entorno con la dirección y la clave del broker compartido
+BROKER_ADDRESS_ENV = "IBMI_BROKER_ADDRESS"
+BROKER_AUTHKEY_ENV = "IBMI_BROKER_AUTHKEY"
+
+# Segundos máximos de espera al arranque del proceso del broker
+BROKER_START_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Caché LRU con expiración para resultados de consultas de solo lectura."""
+
+    def __init__(self, ttl: float, max_entries: int = 256):
+        """
+        Inicializa el caché.
+
+        Args:
+            ttl: Segundos de validez de cada entrada (0 desactiva el caché).
+            max_entries: Número máximo de entradas.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        """Devuelve el valor cacheado o None si no existe o expiró."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, str], value: str) -> None:
+        """Guarda un valor en el caché."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Vacía el caché."""
+        with self._lock:
+            self._entries.clear()
+
+
+class GatewayBroker:
+    """
+    Punto único de acceso a los sistemas IBM i.
+
+    Agrupa el router (pools SSH, health checks y circuit breakers) y el caché
+    de consultas, de forma que todos los procesos del gateway los compartan.
+    """
+
+    def __init__(self, config: GatewayConfig, cache_ttl: float = 30.0):
+        """
+        Inicializa el broker e inicia los health checks.
+
+        Args:
+            config: Configuración multi-sistema.
+            cache_ttl: Segundos de validez del caché de catálogo y fuentes.
+        """
+        self.router = TargetRouter(config)
+        self.cache = ResultCache(cache_ttl)
+        self.router.start()
+
+    @classmethod
+    def from_env(cls) -> 'GatewayBroker':
+        """Crea el broker a partir de las variables de entorno."""
+        config = GatewayConfig.from_env()
+        cache_ttl = float(os.getenv("IBMI_CACHE_TTL", 30))
+        return cls(config, cache_ttl=cache_ttl)
+
+    def execute(
+        self,
+        command: str,
+        target: Optional[str] = None,
+        write: bool = False,
+        balanced: bool = False,
+        cacheable: bool = False
+    ) -> Tuple[str, str]:
+        """
+        Ejecuta un comando en el sistema adecuado.
+
+        Args:
+            command: Comando CL o consulta SQL ya validado.
+            target: Sistema IBM i pedido (default: selección automática).
+            write: Si el comando puede modificar el sistema.
+            balanced: Si la consulta de catálogo o fuentes puede enviarse
+                a la réplica sana más rápida del sistema por defecto.
+            cacheable: Si el resultado puede servirse desde el caché.
+
+        Returns:
+            Tupla de (stdout, stderr) como strings.
+
+        Raises:
+            ValueError: Si el sistema pedido no existe o no admite la operación.
+        """
+        if write:
+            name = self.router.select_write(target)
+        elif balanced:
+            name = self.router.select_read(target)
+        else:
+            # Comandos de trabajos o del sistema: muestran el estado propio de
+            # cada partición, así que nunca se desvían a una réplica
+            name = self.router.resolve(target)
+
+        # Las réplicas comparten datos con su sistema principal
+        key = (self.router.config.targets[name].replica_of or name, command)
+        if cacheable:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, ""
+
+        output, error = self.router.execute(name, command)
+
+        if write:
+            # Una compilación puede crear objetos: el catálogo ya no es válido
+            self.cache.clear()
+        elif cacheable and not error:
+            self.cache.put(key, output)
+
+        return output, error
+
+    def status(self) -> List[str]:
+        """Describe el estado de cada sistema."""
+        return self.router.status()
+
+
+_broker: Optional[GatewayBroker] = None
+_broker_lock = threading.Lock()
+
+
+def _local_broker() -> GatewayBroker:
+    """Obtiene el broker de este proceso, creándolo en el primer uso."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = GatewayBroker.from_env()
+        return _broker
+
+
+class BrokerManager(BaseManager):
+    """Manager de multiprocessing que expone el broker a otros procesos."""
+
+
+BrokerManager.register("broker", callable=_local_broker, exposed=("execute", "status"))
+
+
+def _serve_broker(address, authkey, initializer, initargs, ready) -> None:
+    """Proceso del broker: atiende a los workers hasta que lo terminen."""
+    if initializer is not None:
+        initializer(*initargs)
+    server = BrokerManager(address=address, authkey=authkey).get_server()
+    ready.send(server.address)
+    ready.close()
+    server.serve_forever()
+
+
+def serve_broker(config: BrokerConfig) -> None:
+    """
+    Atiende a los workers como broker externo, en primer plano.
+
+    Lo usa `ibmi-gateway --transport broker`: escucha en IBMI_BROKER_ADDRESS
+    con la clave de IBMI_BROKER_AUTHKEY, que los gateways deben compartir.
+
+    Args:
+        config: Dirección de escucha y clave ya validadas.
+    """
+    # Crea el broker antes de aceptar workers para fallar al arrancar
+    _local_broker()
+    server = BrokerManager(address=config.address, authkey=config.authkey).get_server()
+    host, port = server.address
+    logger.info("Broker escuchando en %s:%s", host, port)
+    server.serve_forever()
+
+
+class BrokerSupervisor:
+    """
+    Proceso del broker compartido, vigilado desde el proceso principal.
+
+    Si el proceso muere se vuelve a lanzar en la misma dirección y con la
+    misma clave, de modo que los workers se reconectan sin reiniciarse.
+    """
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        initializer: Optional[Callable[..., None]] = None,
+        initargs: tuple = (),
+        interval: float = 1.0
+    ):
+        """
+        Inicializa el supervisor.
+
+        Args:
+            address: Dirección de escucha; el puerto 0 elige uno libre.
+            initializer: Función a ejecutar en el proceso del broker al arrancar.
+            initargs: Argumentos de `initializer`.
+            interval: Segundos entre comprobaciones del proceso.
+        """
+        self.address = address
+        self.authkey = os.urandom(16)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.interval = interval
+        self.process = None
+        self.restarts = 0
+        # spawn: el proceso principal ya puede tener hilos en marcha
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _spawn(self) -> None:
+        """Lanza el proceso del broker y espera a que escuche."""
+        reader, writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_serve_broker,
+            args=(self.address, self.authkey, self.initializer, self.initargs, writer),
+            name="ibmi-broker",
+            daemon=True,
+        )
+        process.start()
+        writer.close()
+        try:
+            if not reader.poll(BROKER_START_TIMEOUT):
+                raise EOFError
+            self.address = reader.recv()
+        except EOFError:
+            process.terminate()
+            raise RuntimeError(f"El broker no arrancó en {self.address[0]}:{self.address[1]}.")
+        finally:
+            reader.close()
+        self.process = process
+
+    def start(self) -> None:
+        """Arranca el broker, publica su dirección y comienza a vigilarlo."""
+        self._spawn()
+        host, port = self.address
+        os.environ[BROKER_ADDRESS_ENV] = f"{host}:{port}"
+        os.environ[BROKER_AUTHKEY_ENV] = self.authkey.hex()
+        self._thread = threading.Thread(target=self._watch, name="ibmi-broker-watch", daemon=True)
+        self._thread.start()
+
+    def _watch(self) -> None:
+        """Relanza el broker si su proceso termina."""
+        while not self._stop.wait(self.interval):
+            if self.process.is_alive():
+                continue
+            logger.warning("El proceso del broker terminó (código %s); reiniciando.", self.process.exitcode)
+            try:
+                self._spawn()
+                self.restarts += 1
+            except Exception as e:
+                logger.error("No se pudo reiniciar el broker: %s", e)
+
+    def shutdown(self) -> None:
+        """Detiene la vigilancia y termina el proceso del broker."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+
+
+def start_broker(
+    address: Tuple[str, int] = ("127.0.0.1", 0),
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: tuple = ()
+) -> BrokerSupervisor:
+    """
+    Inicia el broker compartido en un proceso aparte y supervisado.
+
+    Publica su dirección y clave en las variables de entorno para que los
+    procesos hijos (workers HTTP) se conecten a él.
+
+    Args:
+        address: Dirección de escucha; el puerto 0 elige uno libre.
+        initializer: Función a ejecutar en el proceso del broker al arrancar.
+        initargs: Argumentos de `initializer`.
+
+    Returns:
+        El supervisor iniciado; llamar a shutdown() al terminar.
+    """
+    supervisor = BrokerSupervisor(address, initializer, initargs)
+    supervisor.start()
+    return supervisor
+
+
+class RemoteBroker:
+    """
+    Acceso al broker compartido desde un worker.
+
+    Si la conexión con el proceso del broker se pierde (porque murió o se
+    reinició), descarta el proxy y se reconecta una vez antes de fallar.
+    Las escrituras (compilaciones) no se repiten si la conexión se pierde
+    con la llamada ya enviada: el broker pudo ejecutarla antes de caer, y
+    repetirla compilaría dos veces sin que nadie lo sepa.
+    """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes):
+        """
+        Inicializa el acceso remoto.
+
+        Args:
+            address: Dirección del broker.
+            authkey: Clave compartida con el broker.
+        """
+        self.address = address
+        self.authkey = authkey
+        self._proxy = None
+        self._lock = threading.Lock()
+
+    def _get_proxy(self):
+        """Obtiene el proxy actual, conectando si hace falta."""
+        with self._lock:
+            if self._proxy is None:
+                manager = BrokerManager(address=self.address, authkey=self.authkey)
+                manager.connect()
+                self._proxy = manager.broker()
+            return self._proxy
+
+    def _drop(self, proxy) -> None:
+        """Descarta un proxy roto (si nadie lo ha sustituido ya)."""
+        # Los proxies de multiprocessing comparten por hilo y dirección la
+        # conexión al manager; sin cerrarla, el proxy nuevo reusaría el socket roto
+        connection = getattr(proxy._tls, "connection", None)
+        if connection is not None:
+            connection.close()
+            del proxy._tls.connection
+        with self._lock:
+            if self._proxy is proxy:
+                self._proxy = None
+
+    def _call(self, method: str, *args, retry: bool = True):
+        """
+        Llama a un método del broker, reconectando una vez si se perdió.
+
+        Los fallos al conectar siempre se reintentan: la llamada aún no se
+        envió. Los fallos con la llamada ya enviada solo se reintentan si
+        `retry` es True, es decir, si repetirla no tiene efectos.
+        """
+        for attempt in range(2):
+            try:
+                proxy = self._get_proxy()
+            except AuthenticationError as e:
+                raise ConnectionError(
+                    "Broker no disponible: rechazó la clave (revisa IBMI_BROKER_AUTHKEY)."
+                ) from e
+            except (EOFError, ConnectionError) as e:
+                if attempt:
+                    raise ConnectionError(f"Broker no disponible: {str(e) or type(e).__name__}") from e
+                continue
+
+            try:
+                return getattr(proxy, method)(*args)
+            except (EOFError, ConnectionError) as e:
+                self._drop(proxy)
+                if attempt or not retry:
+                    raise ConnectionError(f"Broker no disponible: {str(e) or type(e).__name__}") from e
+
+    def execute(
+        self,
+        command: str,
+        target: Optional[str] = None,
+        write: bool = False,
+        balanced: bool = False,
+        cacheable: bool = False
+    ) -> Tuple[str, str]:
+        """Ver GatewayBroker.execute; las escrituras no se reintentan."""
+        return self._call("execute", command, target, write, balanced, cacheable, retry=not write)
+
+    def status(self) -> List[str]:
+        """Ver GatewayBroker.status."""
+        return self._call("status")
+
+
+_remote: Optional[RemoteBroker] = None
+_remote_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Obtiene el broker a usar desde este proceso.
+
+    Si IBMI_BROKER_ADDRESS está definida devuelve un acceso remoto al broker
+    compartido; en caso contrario, el broker local del proceso.
+
+    Raises:
+        ValueError: Si la dirección o la clave del broker no son válidas.
+    """
+    global _remote
+    if not os.getenv(BROKER_ADDRESS_ENV):
+        return _local_broker()
+
+    with _remote_lock:
+        if _remote is None:
+            config = BrokerConfig.from_env()
+            config.validate()
+            _remote = RemoteBroker(config.address, config.authkey)
+        return _remote
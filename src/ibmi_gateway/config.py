@@ -5,40 +5,269 @@ Author: Santiago Pernia
 
 import os
 from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
 
 
 @dataclass
 class IBMiConfig:
     """Configuración para la conexión IBM i."""
-    
+
     host: str
     user: str
     password: str
     port: int = 22
     ssh_timeout: int = 30
-    
+    command_timeout: int = 300
+    banner_timeout: int = 60
+    auth_timeout: int = 60
+    pool_timeout: float = 30.0
+    breaker_failures: int = 3
+    breaker_max_delay: float = 60.0
+    name: str = "default"
+    replica_of: Optional[str] = None
+    pool_size: int = 2
+    pool_max_idle: float = 300.0
+    keepalive_interval: int = 30
+
+    @property
+    def read_only(self) -> bool:
+        """Indica si el sistema es una réplica de solo lectura."""
+        return self.replica_of is not None
+
     @classmethod
-    def from_env(cls) -> 'IBMiConfig':
-        """Carga la configuración desde variables de entorno."""
+    def from_env(cls, prefix: str = "IBMI_", name: str = "default") -> 'IBMiConfig':
+        """
+        Carga la configuración desde variables de entorno.
+
+        Args:
+            prefix: Prefijo de las variables (ej. 'IBMI_' o 'IBMI_DEV_').
+            name: Nombre lógico del sistema.
+        """
         load_dotenv()
-        
-        host = os.getenv("IBMI_HOST")
-        user = os.getenv("IBMI_USER")
-        password = os.getenv("IBMI_PASS")
-        port = int(os.getenv("IBMI_PORT", 22))
-        ssh_timeout = int(os.getenv("IBMI_SSH_TIMEOUT", 30))
-        
+
+        # Usuario y contraseña pueden heredarse de las variables globales
+        host = os.getenv(f"{prefix}HOST")
+        user = os.getenv(f"{prefix}USER", os.getenv("IBMI_USER"))
+        password = os.getenv(f"{prefix}PASS", os.getenv("IBMI_PASS"))
+        port = int(os.getenv(f"{prefix}PORT", os.getenv("IBMI_PORT", 22)))
+        ssh_timeout = int(os.getenv(f"{prefix}SSH_TIMEOUT", os.getenv("IBMI_SSH_TIMEOUT", 30)))
+        command_timeout = int(os.getenv(f"{prefix}COMMAND_TIMEOUT", os.getenv("IBMI_COMMAND_TIMEOUT", 300)))
+        banner_timeout = int(os.getenv(f"{prefix}BANNER_TIMEOUT", os.getenv("IBMI_BANNER_TIMEOUT", 60)))
+        auth_timeout = int(os.getenv(f"{prefix}AUTH_TIMEOUT", os.getenv("IBMI_AUTH_TIMEOUT", 60)))
+        breaker_failures = int(os.getenv(f"{prefix}BREAKER_FAILURES", os.getenv("IBMI_BREAKER_FAILURES", 3)))
+        breaker_max_delay = float(os.getenv(f"{prefix}BREAKER_MAX_DELAY", os.getenv("IBMI_BREAKER_MAX_DELAY", 60)))
+        pool_timeout = float(os.getenv(f"{prefix}POOL_TIMEOUT", os.getenv("IBMI_POOL_TIMEOUT", 30)))
+        pool_size = int(os.getenv(f"{prefix}POOL_SIZE", os.getenv("IBMI_POOL_SIZE", 2)))
+        pool_max_idle = float(os.getenv(f"{prefix}POOL_MAX_IDLE", os.getenv("IBMI_POOL_MAX_IDLE", 300)))
+        keepalive_interval = int(os.getenv(f"{prefix}KEEPALIVE", os.getenv("IBMI_KEEPALIVE", 30)))
+        replica_of = os.getenv(f"{prefix}REPLICA_OF") or None
+
         if not all([host, user, password]):
             raise ValueError(
                 "Faltan variables de entorno requeridas. "
-                "Por favor configura IBMI_HOST, IBMI_USER, y IBMI_PASS en tu archivo .env."
+                f"Por favor configura {prefix}HOST, {prefix}USER, y {prefix}PASS en tu archivo .env."
             )
-        
+
         return cls(
             host=host,
             user=user,
             password=password,
             port=port,
-            ssh_timeout=ssh_timeout
+            ssh_timeout=ssh_timeout,
+            command_timeout=command_timeout,
+            banner_timeout=banner_timeout,
+            auth_timeout=auth_timeout,
+            breaker_failures=breaker_failures,
+            breaker_max_delay=breaker_max_delay,
+            name=name,
+            replica_of=replica_of.lower() if replica_of else None,
+            pool_size=pool_size,
+            pool_timeout=pool_timeout,
+            pool_max_idle=pool_max_idle,
+            keepalive_interval=keepalive_interval
+        )
+
+
+@dataclass
+class GatewayConfig:
+    """Configuración multi-sistema (varias particiones IBM i)."""
+
+    targets: Dict[str, IBMiConfig]
+    default_target: str
+    health_interval: float = 15.0
+    health_failures: int = 2
+
+    @classmethod
+    def from_env(cls) -> 'GatewayConfig':
+        """
+        Carga la configuración desde variables de entorno.
+
+        Si IBMI_TARGETS no está definida se usa un único sistema 'default'
+        construido con IBMI_HOST, IBMI_USER e IBMI_PASS.
+        """
+        load_dotenv()
+
+        names = [n.strip().lower() for n in os.getenv("IBMI_TARGETS", "").split(",") if n.strip()]
+        health_interval = float(os.getenv("IBMI_HEALTH_INTERVAL", 15))
+        health_failures = int(os.getenv("IBMI_HEALTH_FAILURES", 2))
+
+        if not names:
+            config = IBMiConfig.from_env()
+            return cls(
+                targets={config.name: config},
+                default_target=config.name,
+                health_interval=health_interval,
+                health_failures=health_failures
+            )
+
+        targets = {
+            name: IBMiConfig.from_env(prefix=f"IBMI_{name.upper()}_", name=name)
+            for name in names
+        }
+
+        for config in targets.values():
+            if config.replica_of and config.replica_of not in targets:
+                raise ValueError(
+                    f"El sistema '{config.name}' es réplica de '{config.replica_of}', "
+                    "que no está definido en IBMI_TARGETS."
+                )
+
+        default_target = os.getenv("IBMI_DEFAULT_TARGET", "").strip().lower()
+        if not default_target:
+            writable = [n for n in names if not targets[n].read_only]
+            default_target = writable[0] if writable else names[0]
+
+        if default_target not in targets:
+            raise ValueError(
+                f"IBMI_DEFAULT_TARGET '{default_target}' no está definido en IBMI_TARGETS."
+            )
+
+        return cls(
+            targets=targets,
+            default_target=default_target,
+            health_interval=health_interval,
+            health_failures=health_failures
+        )
+
+
+# Direcciones de escucha consideradas locales
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+@dataclass
+class HttpConfig:
+    """Configuración del modo streamable HTTP."""
+
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 1
+    token: Optional[str] = None
+    allowed_hosts: Tuple[str, ...] = ()
+    allowed_origins: Tuple[str, ...] = ()
+
+    @property
+    def is_loopback(self) -> bool:
+        """Indica si el gateway solo escucha en la máquina local."""
+        return self.host in LOOPBACK_HOSTS
+
+    @classmethod
+    def from_env(cls) -> 'HttpConfig':
+        """Carga la configuración HTTP desde variables de entorno."""
+        load_dotenv()
+
+        def split(value: str) -> Tuple[str, ...]:
+            return tuple(v.strip() for v in value.split(",") if v.strip())
+
+        return cls(
+            host=os.getenv("IBMI_HTTP_HOST", "127.0.0.1"),
+            port=int(os.getenv("IBMI_HTTP_PORT", 8000)),
+            workers=int(os.getenv("IBMI_HTTP_WORKERS", 1)),
+            token=os.getenv("IBMI_HTTP_TOKEN") or None,
+            allowed_hosts=split(os.getenv("IBMI_HTTP_ALLOWED_HOSTS", "")),
+            allowed_origins=split(os.getenv("IBMI_HTTP_ALLOWED_ORIGINS", ""))
         )
+
+    def validate(self) -> None:
+        """
+        Comprueba que la configuración sea segura para exponer el gateway.
+
+        Raises:
+            ValueError: Si se escucha fuera de la máquina local sin token o
+                sin lista de hosts permitidos.
+        """
+        if self.is_loopback:
+            return
+        if not self.token:
+            raise ValueError(
+                f"El gateway escucha en {self.host}: configura IBMI_HTTP_TOKEN "
+                "para exigir autenticación a los clientes."
+            )
+        if not self.allowed_hosts:
+            raise ValueError(
+                f"El gateway escucha en {self.host}: configura IBMI_HTTP_ALLOWED_HOSTS "
+                "(ej. 'gateway.miempresa.local:*') para la protección DNS rebinding."
+            )
+
+
+# Longitud mínima de la clave del broker (bytes)
+BROKER_AUTHKEY_MIN_BYTES = 16
+
+
+@dataclass
+class BrokerConfig:
+    """Dirección y clave del broker compartido entre workers HTTP."""
+
+    address: Optional[Tuple[str, int]] = None
+    authkey: Optional[bytes] = None
+
+    @classmethod
+    def from_env(cls) -> 'BrokerConfig':
+        """
+        Carga la configuración del broker desde variables de entorno.
+
+        Raises:
+            ValueError: Si IBMI_BROKER_ADDRESS no es 'host:puerto' o
+                IBMI_BROKER_AUTHKEY no es hexadecimal.
+        """
+        load_dotenv()
+
+        address = None
+        raw_address = os.getenv("IBMI_BROKER_ADDRESS", "").strip()
+        if raw_address:
+            host, _, port = raw_address.rpartition(":")
+            if not host or not port.isdigit():
+                raise ValueError(
+                    f"IBMI_BROKER_ADDRESS '{raw_address}' no es válida; usa 'host:puerto'."
+                )
+            address = (host, int(port))
+
+        authkey = None
+        raw_authkey = os.getenv("IBMI_BROKER_AUTHKEY", "").strip()
+        if raw_authkey:
+            try:
+                authkey = bytes.fromhex(raw_authkey)
+            except ValueError:
+                raise ValueError("IBMI_BROKER_AUTHKEY debe ser una clave hexadecimal.")
+
+        return cls(address=address, authkey=authkey)
+
+    def validate(self) -> None:
+        """
+        Comprueba que dirección y clave se hayan configurado juntas.
+
+        Raises:
+            ValueError: Si hay dirección sin clave, clave sin dirección o
+                una clave demasiado corta.
+        """
+        if self.address and not self.authkey:
+            raise ValueError(
+                "IBMI_BROKER_ADDRESS requiere IBMI_BROKER_AUTHKEY con la clave del broker."
+            )
+        if self.authkey and not self.address:
+            raise ValueError("IBMI_BROKER_AUTHKEY requiere IBMI_BROKER_ADDRESS.")
+        if self.authkey and len(self.authkey) < BROKER_AUTHKEY_MIN_BYTES:
+            raise ValueError(
+                f"IBMI_BROKER_AUTHKEY debe tener al menos {BROKER_AUTHKEY_MIN_BYTES * 2} "
+                "caracteres hexadecimales (ej. 'openssl rand -hex 32')."
+            )
@@ -3,11 +3,25 @@ Gestión de conexión SSH para sistemas IBM i.
 Author: Santiago Pernia
 """
 
+import socket
 import paramiko
 from typing import Tuple
+from .breaker import ERROR_OTHER, classify_error
 from .config import IBMiConfig
 
 
+class ConnectionFailedError(RuntimeError):
+    """Fallo al conectar; `kind` indica la clase del error (ver classify_error)."""
+
+    def __init__(self, message: str, kind: str = ERROR_OTHER):
+        super().__init__(message)
+        self.kind = kind
+
+
+class SessionLostError(ConnectionError):
+    """La sesión SSH no permitió abrir el canal: el comando no llegó a ejecutarse."""
+
+
 class IBMiConnection:
     """Gestiona la conexión SSH al sistema IBM i."""
     
@@ -38,8 +52,8 @@ class IBMiConnection:
                 timeout=self.config.ssh_timeout,
                 look_for_keys=False,
                 allow_agent=False,
-                banner_timeout=200,
-                auth_timeout=200,
+                banner_timeout=self.config.banner_timeout,
+                auth_timeout=self.config.auth_timeout,
                 disabled_algorithms={
                     'pubkeys': ['rsa-sha2-512', 'rsa-sha2-256'],
                     'keys': ['rsa-sha2-512', 'rsa-sha2-256']
@@ -47,8 +61,13 @@ class IBMiConnection:
                 gss_auth=False,
                 gss_kex=False
             )
+            # Mantiene viva la sesión ociosa del pool ante firewalls con
+            # expiración de conexiones inactivas
+            if self.config.keepalive_interval > 0:
+                self.client.get_transport().set_keepalive(self.config.keepalive_interval)
         except Exception as e:
-            raise RuntimeError(f"Conexión fallida: {str(e)}")
+            self.close()
+            raise ConnectionFailedError(f"Conexión fallida: {str(e)}", classify_error(e)) from e
     
     def execute(self, command: str) -> Tuple[str, str]:
         """
@@ -59,6 +78,10 @@ class IBMiConnection:
             
         Returns:
             Tupla de (stdout, stderr) como strings.
+            
+        Raises:
+            SessionLostError: Si la sesión no responde al abrir el canal.
+            TimeoutError: Si el comando no termina en `command_timeout` segundos.
         """
         if not self.client:
             raise RuntimeError("No conectado. Llama a connect() primero.")
@@ -68,13 +91,39 @@ class IBMiConnection:
         if not command.upper().startswith("SELECT"):
             cmd_to_run = f'system "{command}"'
         
-        stdin, stdout, stderr = self.client.exec_command(cmd_to_run)
+        # Abrir el canal solo espera `ssh_timeout`: una sesión que murió
+        # estando ociosa se detecta aquí, antes de enviar el comando
+        transport = self.client.get_transport()
+        try:
+            if transport is None or not transport.is_active():
+                raise EOFError("sesión cerrada")
+            channel = transport.open_session(timeout=self.config.ssh_timeout)
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            raise SessionLostError(f"La sesión SSH no responde: {str(e) or type(e).__name__}") from e
+        
+        # El timeout del canal evita que un comando colgado retenga la sesión
+        channel.settimeout(self.config.command_timeout)
+        channel.exec_command(cmd_to_run)
+        stdout = channel.makefile("r")
+        stderr = channel.makefile_stderr("r")
         
-        output = stdout.read().decode('utf-8')
-        error = stderr.read().decode('utf-8')
+        try:
+            output = stdout.read().decode('utf-8')
+            error = stderr.read().decode('utf-8')
+        except socket.timeout:
+            raise TimeoutError(
+                f"El comando no respondió en {self.config.command_timeout}s."
+            )
         
         return output, error
-    
+
+    def is_active(self) -> bool:
+        """Indica si la sesión SSH sigue abierta y utilizable."""
+        if not self.client:
+            return False
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
     def close(self) -> None:
         """Cierra la conexión SSH."""
         if self.client:
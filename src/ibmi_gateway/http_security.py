@@ -0,0 +1,58 @@
+"""
+Autenticación y protección DNS rebinding para el modo streamable HTTP.
+Author: Santiago Pernia
+"""
+
+import hmac
+from mcp.server.transport_security import TransportSecuritySettings
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .config import HttpConfig
+
+# Hosts y orígenes locales siempre permitidos
+LOCAL_ALLOWED_HOSTS = ["127.0.0.1:*", "localhost:*", "[::1]:*"]
+LOCAL_ALLOWED_ORIGINS = ["http://127.0.0.1:*", "http://localhost:*", "http://[::1]:*"]
+
+
+def transport_security(config: HttpConfig) -> TransportSecuritySettings:
+    """
+    Construye la protección DNS rebinding con los hosts y orígenes configurados.
+
+    Args:
+        config: Configuración HTTP.
+    """
+    return TransportSecuritySettings(
+        enable_dns_rebinding_protection=True,
+        allowed_hosts=LOCAL_ALLOWED_HOSTS + list(config.allowed_hosts),
+        allowed_origins=LOCAL_ALLOWED_ORIGINS + list(config.allowed_origins),
+    )
+
+
+class BearerTokenMiddleware:
+    """Middleware ASGI que exige `Authorization: Bearer <IBMI_HTTP_TOKEN>`."""
+
+    def __init__(self, app: ASGIApp, token: str):
+        """
+        Inicializa el middleware.
+
+        Args:
+            app: Aplicación ASGI protegida.
+            token: Token compartido esperado.
+        """
+        self.app = app
+        self.token = token.encode()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Rechaza con 401 las peticiones HTTP sin el token correcto."""
+        if scope["type"] == "http":
+            headers = dict(scope.get("headers", []))
+            scheme, _, value = headers.get(b"authorization", b"").partition(b" ")
+            if scheme.lower() != b"bearer" or not hmac.compare_digest(value.strip(), self.token):
+                response = JSONResponse(
+                    {"error": "unauthorized", "error_description": "Token inválido o ausente."},
+                    status_code=401,
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,175 @@
+"""
+Pool de conexiones SSH por sistema IBM i.
+Author: Santiago Pernia
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from .breaker import get_breaker
+from .config import IBMiConfig
+from .connection import ConnectionFailedError, IBMiConnection, SessionLostError
+
+# Intervalo con el que una llamada en espera revisa el circuito (segundos)
+WAIT_POLL_INTERVAL = 0.25
+
+
+class PoolTimeoutError(RuntimeError):
+    """No se liberó ninguna sesión del pool dentro del tiempo de espera."""
+
+
+class ConnectionPool:
+    """Reutiliza sesiones SSH abiertas contra un único sistema IBM i."""
+
+    def __init__(self, config: IBMiConfig):
+        """
+        Inicializa el pool.
+
+        Args:
+            config: Configuración del sistema destino.
+        """
+        self.config = config
+        # Conexiones ociosas con el instante en que se devolvieron al pool
+        self._idle: List[Tuple[IBMiConnection, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, config.pool_size))
+        self.breaker = get_breaker(
+            config.host,
+            config.port,
+            failure_threshold=config.breaker_failures,
+            max_delay=config.breaker_max_delay
+        )
+
+    def _take_idle(self) -> Optional[IBMiConnection]:
+        """
+        Obtiene una conexión ociosa válida o None.
+
+        Descarta las sesiones cerradas y las que llevan ociosas más de
+        `pool_max_idle` segundos, que un firewall o el IBM i pueden haber
+        cortado sin avisar.
+        """
+        oldest = time.monotonic() - self.config.pool_max_idle
+        with self._lock:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                if idle_since >= oldest and conn.is_active():
+                    return conn
+                conn.close()
+        return None
+
+    def _put_idle(self, conn: IBMiConnection) -> None:
+        """Devuelve una conexión al pool."""
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def _wait_slot(self) -> None:
+        """
+        Espera un hueco libre en el pool.
+
+        Mientras espera revisa el circuito del host, de modo que las llamadas
+        en cola fallan al instante si el host cae durante la espera.
+
+        Raises:
+            CircuitOpenError: Si el circuito del host está abierto.
+            PoolTimeoutError: Si no se libera ningún hueco en `pool_timeout`.
+        """
+        deadline = time.monotonic() + self.config.pool_timeout
+        while True:
+            self.breaker.ensure_available()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PoolTimeoutError(
+                    f"Las {self.config.pool_size} sesiones SSH de '{self.config.name}' "
+                    f"siguen ocupadas tras {self.config.pool_timeout:.0f}s. "
+                    "Reintenta más tarde o aumenta IBMI_POOL_SIZE."
+                )
+            if self._slots.acquire(timeout=min(remaining, WAIT_POLL_INTERVAL)):
+                return
+
+    def _open(self) -> IBMiConnection:
+        """
+        Abre una conexión nueva pasando por el circuit breaker del host.
+
+        Raises:
+            CircuitOpenError: Si el host está marcado como caído.
+            ConnectionFailedError: Si la conexión falla.
+        """
+        self.breaker.before_call()
+        conn = IBMiConnection(self.config)
+        try:
+            conn.connect()
+        except ConnectionFailedError as e:
+            self.breaker.record_failure(e.kind, str(e))
+            raise
+        self.breaker.record_success()
+        return conn
+
+    @contextmanager
+    def acquire(self) -> Iterator[IBMiConnection]:
+        """
+        Presta una conexión del pool, abriendo una nueva si no hay ociosas.
+
+        Si el circuito del host está abierto falla al instante con
+        CircuitOpenError, tanto antes como durante la espera de un hueco,
+        en lugar de esperar los timeouts de conexión.
+
+        Las conexiones que fallan durante su uso se descartan en lugar de
+        devolverse al pool.
+        """
+        self._wait_slot()
+        conn = None
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = self._open()
+            yield conn
+        except Exception:
+            if conn is not None:
+                conn.close()
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._put_idle(conn)
+            self._slots.release()
+
+    def _run(self, conn: IBMiConnection, command: str) -> Tuple[str, str]:
+        """Ejecuta un comando y devuelve la conexión al pool (o la cierra si falla)."""
+        try:
+            result = conn.execute(command)
+        except Exception:
+            conn.close()
+            raise
+        self._put_idle(conn)
+        return result
+
+    def execute(self, command: str) -> Tuple[str, str]:
+        """
+        Ejecuta un comando con una sesión del pool.
+
+        Si una sesión reutilizada ya no responde al abrir el canal
+        (SessionLostError), el comando no llegó a enviarse: se descarta la
+        sesión y se reintenta una vez con una conexión nueva.
+
+        Returns:
+            Tupla de (stdout, stderr) como strings.
+        """
+        self._wait_slot()
+        try:
+            conn = self._take_idle()
+            if conn is not None:
+                try:
+                    return self._run(conn, command)
+                except SessionLostError:
+                    pass
+            return self._run(self._open(), command)
+        finally:
+            self._slots.release()
+
+    def close_all(self) -> None:
+        """Cierra todas las conexiones ociosas."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
@@ -0,0 +1,207 @@
+"""
+Enrutamiento multi-sistema con health checks y selección por latencia.
+Author: Santiago Pernia
+"""
+
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from .breaker import CircuitBreaker
+from .config import GatewayConfig, IBMiConfig
+from .pool import ConnectionPool
+
+# Peso de la última medición en la media móvil de latencia
+LATENCY_SMOOTHING = 0.3
+
+# Tiempo máximo de espera de un sondeo (segundos)
+PROBE_TIMEOUT = 5
+
+
+def tcp_probe(config: IBMiConfig) -> float:
+    """
+    Mide la latencia de apertura de una conexión TCP al puerto SSH.
+
+    Args:
+        config: Configuración del sistema a sondear.
+
+    Returns:
+        Latencia en segundos. Lanza OSError si el sistema no responde.
+    """
+    start = time.monotonic()
+    with socket.create_connection((config.host, config.port), timeout=min(config.ssh_timeout, PROBE_TIMEOUT)):
+        pass
+    return time.monotonic() - start
+
+
+@dataclass
+class TargetHealth:
+    """Estado de salud de un sistema IBM i."""
+
+    healthy: bool = True
+    latency: Optional[float] = None
+    failures: int = 0
+    last_error: Optional[str] = None
+    last_check: Optional[float] = None
+
+
+class TargetRouter:
+    """Selecciona el sistema IBM i adecuado para cada operación."""
+
+    def __init__(
+        self,
+        config: GatewayConfig,
+        probe: Callable[[IBMiConfig], float] = tcp_probe
+    ):
+        """
+        Inicializa el router.
+
+        Args:
+            config: Configuración multi-sistema.
+            probe: Función de sondeo; devuelve la latencia o lanza una excepción.
+        """
+        self.config = config
+        self.probe = probe
+        self.pools: Dict[str, ConnectionPool] = {
+            name: ConnectionPool(target) for name, target in config.targets.items()
+        }
+        self.health: Dict[str, TargetHealth] = {
+            name: TargetHealth() for name in config.targets
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def resolve(self, target: Optional[str] = None) -> str:
+        """Normaliza el nombre de un sistema, usando el de por defecto si es None."""
+        name = (target or self.config.default_target).strip().lower()
+        if name not in self.config.targets:
+            available = ", ".join(self.config.targets)
+            raise ValueError(f"Sistema desconocido '{target}'. Disponibles: {available}.")
+        return name
+
+    def select_write(self, target: Optional[str] = None) -> str:
+        """
+        Selecciona el sistema para una operación que puede modificar datos.
+
+        Las réplicas de solo lectura se rechazan.
+        """
+        name = self.resolve(target)
+        if self.config.targets[name].read_only:
+            raise ValueError(f"El sistema '{name}' es una réplica de solo lectura.")
+        return name
+
+    def select_read(self, target: Optional[str] = None) -> str:
+        """
+        Selecciona el sistema para una consulta de solo lectura.
+
+        Un sistema explícito se respeta tal cual. Sin sistema, los candidatos
+        son el de por defecto y sus réplicas, y se elige el sano (con el
+        circuito no abierto) de menor latencia medida; si ninguno está sano se usa el de por defecto.
+        """
+        if target:
+            return self.resolve(target)
+
+        name = self.config.default_target
+        candidates = [name] + [
+            n for n, t in self.config.targets.items() if t.replica_of == name
+        ]
+
+        with self._lock:
+            healthy = [
+                n for n in candidates
+                if self.health[n].healthy and self.pools[n].breaker.state != CircuitBreaker.OPEN
+            ]
+            if not healthy:
+                return name
+
+            def sort_key(n: str):
+                latency = self.health[n].latency
+                # Sin medición todavía: al final, priorizando el de por defecto
+                return (latency is None, latency or 0.0, n != name)
+
+            return min(healthy, key=sort_key)
+
+    def execute(self, name: str, command: str) -> Tuple[str, str]:
+        """Ejecuta un comando con el pool del sistema indicado."""
+        return self.pools[name].execute(command)
+
+    def check(self, name: str) -> TargetHealth:
+        """Sondea un sistema y actualiza su estado de salud."""
+        target = self.config.targets[name]
+        try:
+            latency = self.probe(target)
+            error = None
+        except Exception as e:
+            latency = None
+            error = str(e)
+
+        with self._lock:
+            health = self.health[name]
+            health.last_check = time.time()
+            if error is None:
+                if health.latency is None:
+                    health.latency = latency
+                else:
+                    health.latency += LATENCY_SMOOTHING * (latency - health.latency)
+                health.failures = 0
+                health.healthy = True
+                health.last_error = None
+            else:
+                health.failures += 1
+                health.last_error = error
+                if health.failures >= self.config.health_failures:
+                    health.healthy = False
+
+        if not health.healthy:
+            # Sistema expulsado: sus sesiones ociosas ya no sirven
+            self.pools[name].close_all()
+        return health
+
+    def check_all(self) -> None:
+        """Sondea todos los sistemas configurados."""
+        for name in self.config.targets:
+            self.check(name)
+
+    def _run(self) -> None:
+        """Bucle del hilo de health checks."""
+        while not self._stop.is_set():
+            self.check_all()
+            self._stop.wait(self.config.health_interval)
+
+    def start(self) -> None:
+        """Inicia los health checks en segundo plano."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ibmi-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Detiene los health checks y cierra las conexiones ociosas."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        for pool in self.pools.values():
+            pool.close_all()
+
+    def status(self) -> List[str]:
+        """Describe el estado de cada sistema en formato legible."""
+        lines = []
+        with self._lock:
+            for name, target in self.config.targets.items():
+                health = self.health[name]
+                role = f"réplica de {target.replica_of}" if target.read_only else "lectura/escritura"
+                state = "OK" if health.healthy else "FUERA DE SERVICIO"
+                breaker = self.pools[name].breaker.state
+                if breaker != CircuitBreaker.CLOSED:
+                    state += f" (circuito {breaker})"
+                latency = f"{health.latency * 1000:.1f} ms" if health.latency is not None else "sin medir"
+                default = " (por defecto)" if name == self.config.default_target else ""
+                line = f"{name}{default}: {target.host}:{target.port} [{role}] {state}, latencia {latency}"
+                if health.last_error:
+                    line += f", último error: {health.last_error}"
+                lines.append(line)
+        return lines
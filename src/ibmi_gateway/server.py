@@ -3,22 +3,47 @@ Servidor FastMCP para IBM i Gateway.
 Author: Santiago Pernia
 """
 
+import argparse
+import os
+from typing import Optional, Tuple
+import anyio
 from mcp.server.fastmcp import FastMCP
-from .config import IBMiConfig
-from .connection import IBMiConnection
+from .broker import get_broker, serve_broker, start_broker
+from .config import BrokerConfig, GatewayConfig, HttpConfig
+from .http_security import BearerTokenMiddleware, transport_security
 from .security import validate_command, get_security_violation_message
 
 # Inicializar FastMCP
 mcp = FastMCP("Secure IBM i Gateway")
 
 
+async def _execute(
+    command: str,
+    target: Optional[str] = None,
+    write: bool = False,
+    balanced: bool = False,
+    cacheable: bool = False
+) -> Tuple[str, str]:
+    """
+    Ejecuta un comando a través del broker sin bloquear el event loop.
+
+    Raises:
+        ValueError: Si el sistema pedido no existe o no admite la operación.
+    """
+    def run() -> Tuple[str, str]:
+        return get_broker().execute(command, target, write, balanced, cacheable)
+
+    return await anyio.to_thread.run_sync(run)
+
+
 @mcp.tool()
-def execute_system_command(command: str) -> str:
+async def execute_system_command(command: str, target: str = None) -> str:
     """
     Ejecuta un comando CL o consulta SQL en el sistema IBM i de forma segura.
     
     Args:
         command: La cadena de comando CL o consulta SQL (ej., 'WRKACTJOB', 'SELECT * FROM LIB.TABLE')
+        target: Sistema IBM i destino (default: el sistema por defecto)
         
     Returns:
         La salida del comando o un mensaje de violación de seguridad.
@@ -27,33 +52,29 @@ def execute_system_command(command: str) -> str:
     if not validate_command(command):
         return get_security_violation_message()
 
-    # 2. Cargar Configuración
+    # 2. Ejecutar Comando en el sistema pedido (o el de por defecto)
+    write = command.strip().upper().startswith("CRT")
     try:
-        config = IBMiConfig.from_env()
+        output, error = await _execute(command, target, write=write)
     except ValueError as e:
         return f"Error de Configuración: {str(e)}"
-
-    # 3. Ejecutar Comando
-    try:
-        with IBMiConnection(config) as conn:
-            output, error = conn.execute(command)
-            
-            if error:
-                return f"Error: {error}"
-                
-            return output
-
     except Exception as e:
         return f"Error de Ejecución: {str(e)}"
 
+    if error:
+        return f"Error: {error}"
+    
+    return output
+
 
 @mcp.tool()
-def compile_cobol_program(
+async def compile_cobol_program(
     source_library: str,
     source_file: str,
     member: str,
     target_library: str = None,
-    program_name: str = None
+    program_name: str = None,
+    target: str = None
 ) -> str:
     """
     Compila un programa COBOL con debug habilitado.
@@ -64,6 +85,7 @@ def compile_cobol_program(
         member: Nombre del miembro a compilar
         target_library: Biblioteca destino (default: source_library)
         program_name: Nombre del programa compilado (default: member)
+        target: Sistema IBM i destino (default: el sistema por defecto)
         
     Returns:
         Resultado de la compilación con mensajes de error si hay.
@@ -86,33 +108,28 @@ def compile_cobol_program(
     if not validate_command(command):
         return get_security_violation_message()
     
-    # Cargar configuración
+    # Ejecutar compilación (las réplicas de solo lectura no compilan)
     try:
-        config = IBMiConfig.from_env()
+        output, error = await _execute(command, target, write=True)
     except ValueError as e:
         return f"Error de Configuración: {str(e)}"
-    
-    # Ejecutar compilación
-    try:
-        with IBMiConnection(config) as conn:
-            output, error = conn.execute(command)
-            
-            if error:
-                return f"Error de Compilación: {error}"
-                
-            return f"Compilación exitosa de {pgm_name} en {target_lib}\n{output}"
-    
     except Exception as e:
         return f"Error de Ejecución: {str(e)}"
+    
+    if error:
+        return f"Error de Compilación: {error}"
+    
+    return f"Compilación exitosa de {pgm_name} en {target_lib}\n{output}"
 
 
 @mcp.tool()
-def compile_rpg_program(
+async def compile_rpg_program(
     source_library: str,
     source_file: str,
     member: str,
     target_library: str = None,
-    program_name: str = None
+    program_name: str = None,
+    target: str = None
 ) -> str:
     """
     Compila un programa RPG/RPGLE con debug habilitado.
@@ -123,6 +140,7 @@ def compile_rpg_program(
         member: Nombre del miembro a compilar
         target_library: Biblioteca destino (default: source_library)
         program_name: Nombre del programa compilado (default: member)
+        target: Sistema IBM i destino (default: el sistema por defecto)
         
     Returns:
         Resultado de la compilación con mensajes de error si hay.
@@ -145,33 +163,28 @@ def compile_rpg_program(
     if not validate_command(command):
         return get_security_violation_message()
     
-    # Cargar configuración
+    # Ejecutar compilación (las réplicas de solo lectura no compilan)
     try:
-        config = IBMiConfig.from_env()
+        output, error = await _execute(command, target, write=True)
     except ValueError as e:
         return f"Error de Configuración: {str(e)}"
-    
-    # Ejecutar compilación
-    try:
-        with IBMiConnection(config) as conn:
-            output, error = conn.execute(command)
-            
-            if error:
-                return f"Error de Compilación: {error}"
-                
-            return f"Compilación exitosa de {pgm_name} en {target_lib}\n{output}"
-    
     except Exception as e:
         return f"Error de Ejecución: {str(e)}"
+    
+    if error:
+        return f"Error de Compilación: {error}"
+    
+    return f"Compilación exitosa de {pgm_name} en {target_lib}\n{output}"
 
 
 @mcp.tool()
-def compile_cl_program(
+async def compile_cl_program(
     source_library: str,
     source_file: str,
     member: str,
     target_library: str = None,
-    program_name: str = None
+    program_name: str = None,
+    target: str = None
 ) -> str:
     """
     Compila un programa CL con debug habilitado.
@@ -182,6 +195,7 @@ def compile_cl_program(
         member: Nombre del miembro a compilar
         target_library: Biblioteca destino (default: source_library)
         program_name: Nombre del programa compilado (default: member)
+        target: Sistema IBM i destino (default: el sistema por defecto)
         
     Returns:
         Resultado de la compilación con mensajes de error si hay.
@@ -203,30 +217,25 @@ def compile_cl_program(
     if not validate_command(command):
         return get_security_violation_message()
     
-    # Cargar configuración
+    # Ejecutar compilación (las réplicas de solo lectura no compilan)
     try:
-        config = IBMiConfig.from_env()
+        output, error = await _execute(command, target, write=True)
     except ValueError as e:
         return f"Error de Configuración: {str(e)}"
-    
-    # Ejecutar compilación
-    try:
-        with IBMiConnection(config) as conn:
-            output, error = conn.execute(command)
-            
-            if error:
-                return f"Error de Compilación: {error}"
-                
-            return f"Compilación exitosa de {pgm_name} en {target_lib}\n{output}"
-    
     except Exception as e:
         return f"Error de Ejecución: {str(e)}"
+    
+    if error:
+        return f"Error de Compilación: {error}"
+    
+    return f"Compilación exitosa de {pgm_name} en {target_lib}\n{output}"
 
 
 @mcp.tool()
-def list_library_objects(
+async def list_library_objects(
     library: str,
-    object_type: str = "*ALL"
+    object_type: str = "*ALL",
+    target: str = None
 ) -> str:
     """
     Lista objetos en una biblioteca (equivalente a WRKOBJPDM).
@@ -234,6 +243,7 @@ def list_library_objects(
     Args:
         library: Nombre de la biblioteca a consultar
         object_type: Tipo de objeto a filtrar (*ALL, *PGM, *FILE, *DTAARA, etc.)
+        target: Sistema IBM i (default: la réplica sana más rápida)
         
     Returns:
         Lista formateada de objetos con nombre, tipo, texto descriptivo y fecha de creación.
@@ -254,28 +264,28 @@ def list_library_objects(
     if not validate_command(query):
         return get_security_violation_message()
     
-    # Ejecutar consulta
+    # Ejecutar consulta (solo lectura: réplica más rápida, cacheable)
     try:
-        config = IBMiConfig.from_env()
-        with IBMiConnection(config) as conn:
-            output, error = conn.execute(query)
-            
-            if error:
-                return f"Error al consultar objetos: {error}"
-            
-            if not output.strip():
-                return f"No se encontraron objetos en la biblioteca {library}."
-            
-            return f"Objetos en {library} (Tipo: {object_type}):\n{output}"
-    
+        output, error = await _execute(query, target, balanced=True, cacheable=True)
+    except ValueError as e:
+        return f"Error de Configuración: {str(e)}"
     except Exception as e:
         return f"Error de Ejecución: {str(e)}"
+    
+    if error:
+        return f"Error al consultar objetos: {error}"
+    
+    if not output.strip():
+        return f"No se encontraron objetos en la biblioteca {library}."
+    
+    return f"Objetos en {library} (Tipo: {object_type}):\n{output}"
 
 
 @mcp.tool()
-def list_source_members(
+async def list_source_members(
     library: str,
-    source_file: str
+    source_file: str,
+    target: str = None
 ) -> str:
     """
     Lista miembros de un source file (equivalente a WRKMBRPDM).
@@ -283,6 +293,7 @@ def list_source_members(
     Args:
         library: Biblioteca que contiene el source file
         source_file: Nombre del source file (ej. QRPGLESRC, QCBLLESRC)
+        target: Sistema IBM i (default: la réplica sana más rápida)
         
     Returns:
         Lista de miembros con nombre, tipo de source, descripción y última modificación.
@@ -304,29 +315,29 @@ def list_source_members(
     if not validate_command(query):
         return get_security_violation_message()
     
-    # Ejecutar consulta
+    # Ejecutar consulta (solo lectura: réplica más rápida, cacheable)
     try:
-        config = IBMiConfig.from_env()
-        with IBMiConnection(config) as conn:
-            output, error = conn.execute(query)
-            
-            if error:
-                return f"Error al consultar miembros: {error}"
-            
-            if not output.strip():
-                return f"No se encontraron miembros en {library}/{source_file}."
-            
-            return f"Miembros en {library}/{source_file} (ordenados por fecha):\n{output}"
-    
+        output, error = await _execute(query, target, balanced=True, cacheable=True)
+    except ValueError as e:
+        return f"Error de Configuración: {str(e)}"
     except Exception as e:
         return f"Error de Ejecución: {str(e)}"
+    
+    if error:
+        return f"Error al consultar miembros: {error}"
+    
+    if not output.strip():
+        return f"No se encontraron miembros en {library}/{source_file}."
+    
+    return f"Miembros en {library}/{source_file} (ordenados por fecha):\n{output}"
 
 
 @mcp.tool()
-def read_source_member(
+async def read_source_member(
     library: str,
     source_file: str,
-    member: str
+    member: str,
+    target: str = None
 ) -> str:
     """
     Lee el contenido completo de un miembro de source file (código fuente).
@@ -335,6 +346,7 @@ def read_source_member(
         library: Biblioteca que contiene el source file
         source_file: Nombre del source file (ej. QRPGLESRC, QCBLLESRC, PRUCBL)
         member: Nombre del miembro a leer (ej. LECTURASQL)
+        target: Sistema IBM i (default: la réplica sana más rápida)
         
     Returns:
         Contenido del código fuente con números de línea.
@@ -356,27 +368,123 @@ def read_source_member(
     if not validate_command(query):
         return get_security_violation_message()
     
-    # Ejecutar consulta
+    # Ejecutar consulta (solo lectura: réplica más rápida, cacheable)
     try:
-        config = IBMiConfig.from_env()
-        with IBMiConnection(config) as conn:
-            output, error = conn.execute(query)
-            
-            if error:
-                return f"Error al leer el miembro: {error}"
-            
-            if not output.strip():
-                return f"El miembro {library}/{source_file}.{member} está vacío o no existe."
-            
-            return f"Código fuente de {library}/{source_file}.{member}:\n{output}"
+        output, error = await _execute(query, target, balanced=True, cacheable=True)
+    except ValueError as e:
+        return f"Error de Configuración: {str(e)}"
+    except Exception as e:
+        return f"Error de Ejecución: {str(e)}"
+    
+    if error:
+        return f"Error al leer el miembro: {error}"
+    
+    if not output.strip():
+        return f"El miembro {library}/{source_file}.{member} está vacío o no existe."
     
+    return f"Código fuente de {library}/{source_file}.{member}:\n{output}"
+
+
+@mcp.tool()
+async def list_systems() -> str:
+    """
+    Lista los sistemas IBM i configurados con su estado de salud y latencia.
+    
+    Returns:
+        Una línea por sistema con rol, estado y latencia medida.
+    """
+    try:
+        status = await anyio.to_thread.run_sync(lambda: get_broker().status())
+    except ValueError as e:
+        return f"Error de Configuración: {str(e)}"
     except Exception as e:
         return f"Error de Ejecución: {str(e)}"
+    
+    return "Sistemas IBM i configurados:\n" + "\n".join(status)
+
+
+def http_app():
+    """
+    Crea la aplicación ASGI de streamable HTTP para un worker.
+
+    Los workers no guardan sesiones (stateless) para que cualquier proceso
+    pueda atender cualquier petición, y comparten el broker definido en
+    IBMI_BROKER_ADDRESS. Si IBMI_HTTP_TOKEN está definida, toda petición
+    debe traer ese token como Bearer.
+    """
+    config = HttpConfig.from_env()
+    config.validate()
+
+    mcp.settings.stateless_http = True
+    mcp.settings.json_response = True
+    mcp.settings.transport_security = transport_security(config)
+    app = mcp.streamable_http_app()
+    if config.token:
+        return BearerTokenMiddleware(app, config.token)
+    return app
 
 
 def main():
     """Punto de entrada para el servidor."""
-    mcp.run()
+    parser = argparse.ArgumentParser(description="Secure IBM i MCP Gateway")
+    parser.add_argument("--transport", choices=["stdio", "http", "broker"], default="stdio",
+                        help="stdio (un cliente por proceso), streamable HTTP o broker "
+                             "externo para gateways HTTP")
+    parser.add_argument("--host", help="Dirección de escucha HTTP (IBMI_HTTP_HOST)")
+    parser.add_argument("--port", type=int, help="Puerto HTTP (IBMI_HTTP_PORT)")
+    parser.add_argument("--workers", type=int, help="Procesos worker HTTP (IBMI_HTTP_WORKERS)")
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        mcp.run()
+        return
+
+    if args.transport == "broker":
+        try:
+            GatewayConfig.from_env()
+            broker_config = BrokerConfig.from_env()
+            if not broker_config.address:
+                raise ValueError(
+                    "--transport broker requiere IBMI_BROKER_ADDRESS (dirección de escucha) "
+                    "e IBMI_BROKER_AUTHKEY."
+                )
+            broker_config.validate()
+        except ValueError as e:
+            raise SystemExit(f"Error de Configuración: {str(e)}")
+        serve_broker(broker_config)
+        return
+
+    import uvicorn
+
+    # Los argumentos pisan al entorno, que heredan los workers
+    for name, value in (("HOST", args.host), ("PORT", args.port), ("WORKERS", args.workers)):
+        if value is not None:
+            os.environ[f"IBMI_HTTP_{name}"] = str(value)
+
+    # Fallar al arrancar si la configuración es inválida o insegura
+    try:
+        GatewayConfig.from_env()
+        http_config = HttpConfig.from_env()
+        http_config.validate()
+        broker_config = BrokerConfig.from_env()
+        broker_config.validate()
+    except ValueError as e:
+        raise SystemExit(f"Error de Configuración: {str(e)}")
+
+    # Un único broker (pools SSH, circuit breakers y caché) para todos los
+    # workers, salvo que ya se haya indicado uno externo
+    supervisor = None if broker_config.address else start_broker()
+    try:
+        uvicorn.run(
+            "ibmi_gateway.server:http_app",
+            factory=True,
+            host=http_config.host,
+            port=http_config.port,
+            workers=max(1, http_config.workers),
+        )
+    finally:
+        if supervisor is not None:
+            supervisor.shutdown()
 
 
 if __name__ == "__main__":
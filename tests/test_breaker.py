@@ -0,0 +1,209 @@
+"""
+Pruebas unitarias para el circuit breaker y la clasificación de errores.
+Author: Santiago Pernia
+"""
+
+import socket
+import threading
+import time
+import paramiko
+import pytest
+from ibmi_gateway.breaker import (
+    ERROR_AUTH,
+    ERROR_BUSY,
+    ERROR_NETWORK,
+    ERROR_OTHER,
+    CircuitBreaker,
+    CircuitOpenError,
+    classify_error,
+)
+from ibmi_gateway.config import IBMiConfig
+from ibmi_gateway.connection import ConnectionFailedError, IBMiConnection
+from ibmi_gateway.pool import ConnectionPool, PoolTimeoutError
+
+
+def wait_for_state(breaker: CircuitBreaker, state: str, timeout: float = 2.0) -> bool:
+    """Espera a que el breaker alcance un estado."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if breaker.state == state:
+            return True
+        time.sleep(0.005)
+    return False
+
+
+class FlakyProbe:
+    """Sondeo que falla mientras `down` sea True."""
+
+    def __init__(self):
+        self.down = True
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.down:
+            raise OSError("timed out")
+
+
+class TestClassifyError:
+    """Casos de prueba para la clasificación de errores de conexión."""
+
+    def test_auth_errors(self):
+        """Prueba que los errores de credenciales no sean transitorios."""
+        assert classify_error(paramiko.AuthenticationException("bad")) == ERROR_AUTH
+
+    def test_network_errors(self):
+        """Prueba que los timeouts y rechazos de red se clasifiquen como red."""
+        assert classify_error(socket.timeout("timed out")) == ERROR_NETWORK
+        assert classify_error(ConnectionRefusedError()) == ERROR_NETWORK
+
+    def test_busy_errors(self):
+        """Prueba que un host sin banner SSH se clasifique como ocupado."""
+        assert classify_error(paramiko.SSHException("Error reading SSH protocol banner")) == ERROR_BUSY
+        assert classify_error(EOFError()) == ERROR_BUSY
+
+    def test_auth_hang_is_busy(self):
+        """Prueba que una autenticación colgada o cortada por el host sea transitoria."""
+        assert classify_error(paramiko.AuthenticationException("Authentication timeout.")) == ERROR_BUSY
+        assert classify_error(
+            paramiko.AuthenticationException("Authentication failed: transport shut down or saw EOF")
+        ) == ERROR_BUSY
+        assert classify_error(paramiko.AuthenticationException("Authentication failed.")) == ERROR_AUTH
+
+    def test_other_errors(self):
+        """Prueba que los errores de negociación no se consideren transitorios."""
+        assert classify_error(paramiko.SSHException("Incompatible ssh peer")) == ERROR_OTHER
+
+
+class TestCircuitBreaker:
+    """Casos de prueba para los estados del circuit breaker."""
+
+    def test_opens_after_transient_failures(self):
+        """Prueba que el circuito se abra tras el umbral de fallos transitorios."""
+        breaker = CircuitBreaker("host:22", FlakyProbe(), failure_threshold=2, base_delay=60)
+        breaker.record_failure(ERROR_NETWORK)
+        breaker.before_call()
+        breaker.record_failure(ERROR_BUSY)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_auth_failures_do_not_trip(self):
+        """Prueba que los errores de autenticación no abran el circuito."""
+        breaker = CircuitBreaker("host:22", FlakyProbe(), failure_threshold=1, base_delay=60)
+        breaker.record_failure(ERROR_AUTH)
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.before_call()
+
+    def test_recovers_through_half_open(self):
+        """Prueba el sondeo con backoff y el cierre tras una conexión de prueba."""
+        probe = FlakyProbe()
+        breaker = CircuitBreaker("host:22", probe, failure_threshold=1, base_delay=0.01, max_delay=0.02)
+        breaker.record_failure(ERROR_NETWORK)
+
+        while probe.calls < 2:
+            time.sleep(0.005)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        probe.down = False
+        assert wait_for_state(breaker, CircuitBreaker.HALF_OPEN)
+
+        # Solo una conexión de prueba a la vez
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_trial_reopens(self):
+        """Prueba que un fallo en la conexión de prueba reabra el circuito."""
+        probe = FlakyProbe()
+        probe.down = False
+        breaker = CircuitBreaker("host:22", probe, failure_threshold=1, base_delay=0.01)
+        breaker.record_failure(ERROR_NETWORK)
+        assert wait_for_state(breaker, CircuitBreaker.HALF_OPEN)
+
+        probe.down = True
+        breaker.before_call()
+        breaker.record_failure(ERROR_NETWORK)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        probe.down = False
+        assert wait_for_state(breaker, CircuitBreaker.HALF_OPEN)
+
+
+class TestConnectionPoolFastFail:
+    """Casos de prueba para el fallo rápido del pool con el circuito abierto."""
+
+    def make_pool(self, monkeypatch, host: str, release: threading.Event, **kwargs):
+        """Pool cuyas conexiones nuevas quedan colgadas hasta `release`."""
+        def slow_connect(self):
+            release.wait(3)
+            raise ConnectionFailedError("Conexión fallida: timed out", ERROR_NETWORK)
+
+        monkeypatch.setattr(IBMiConnection, "connect", slow_connect)
+        config = IBMiConfig(host=host, user="u", password="p", pool_size=2, breaker_failures=1, **kwargs)
+        return ConnectionPool(config)
+
+    def hold_slots(self, pool: ConnectionPool):
+        """Ocupa los dos huecos del pool con conexiones colgadas."""
+        def use():
+            try:
+                with pool.acquire():
+                    pass
+            except RuntimeError:
+                pass
+
+        threads = [threading.Thread(target=use, daemon=True) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        return threads
+
+    def test_queued_call_fails_when_circuit_opens(self, monkeypatch):
+        """Prueba que una llamada en cola no espere a las conexiones colgadas."""
+        release = threading.Event()
+        pool = self.make_pool(monkeypatch, "queued.invalid", release)
+        self.hold_slots(pool)
+
+        # Con el circuito abierto ni siquiera se espera un hueco
+        pool.breaker.record_failure(ERROR_NETWORK)
+        with pytest.raises(CircuitOpenError):
+            with pool.acquire():
+                pass
+        pool.breaker.record_success()
+
+        # Una llamada ya en cola falla en cuanto el circuito se abre
+        result = {}
+
+        def queued():
+            try:
+                with pool.acquire():
+                    pass
+            except Exception as e:
+                result["error"] = e
+                result["at"] = time.monotonic()
+
+        thread = threading.Thread(target=queued, daemon=True)
+        thread.start()
+        time.sleep(0.1)
+        opened_at = time.monotonic()
+        pool.breaker.record_failure(ERROR_NETWORK)
+        thread.join(1)
+
+        assert isinstance(result.get("error"), CircuitOpenError)
+        assert result["at"] - opened_at < 0.5
+        release.set()
+
+    def test_pool_wait_times_out(self, monkeypatch):
+        """Prueba que la espera de un hueco tenga límite."""
+        release = threading.Event()
+        pool = self.make_pool(monkeypatch, "busy.invalid", release, pool_timeout=0.2)
+        self.hold_slots(pool)
+
+        with pytest.raises(PoolTimeoutError):
+            with pool.acquire():
+                pass
+        release.set()
@@ -0,0 +1,265 @@
+"""
+Pruebas unitarias para el broker compartido y su caché.
+Author: Santiago Pernia
+"""
+
+import os
+import time
+import pytest
+from ibmi_gateway import broker as broker_module
+from ibmi_gateway.breaker import CircuitOpenError
+from ibmi_gateway.broker import (
+    BROKER_ADDRESS_ENV,
+    BROKER_AUTHKEY_ENV,
+    BrokerManager,
+    GatewayBroker,
+    ResultCache,
+    get_broker,
+    start_broker,
+)
+from ibmi_gateway.config import BrokerConfig, GatewayConfig, IBMiConfig
+
+
+class FakeConnection:
+    """Conexión simulada que cuenta los comandos ejecutados."""
+
+    def __init__(self):
+        self.commands = []
+
+    def execute(self, command: str):
+        self.commands.append(command)
+        return f"salida {len(self.commands)}", ""
+
+
+@pytest.fixture
+def broker():
+    """Broker con dev y su réplica ha, sin conexiones SSH reales."""
+    targets = {
+        "dev": IBMiConfig(host="dev.invalid", user="u", password="p", name="dev"),
+        "ha": IBMiConfig(host="ha.invalid", user="u", password="p", name="ha", replica_of="dev"),
+    }
+    broker = GatewayBroker(GatewayConfig(targets=targets, default_target="dev"), cache_ttl=60)
+    broker.router.stop()
+
+    conn = FakeConnection()
+    conn.systems = []
+
+    def execute(name, command):
+        conn.systems.append(name)
+        return conn.execute(command)
+
+    broker.router.execute = execute
+    broker.conn = conn
+    return broker
+
+
+class TestResultCache:
+    """Casos de prueba para el caché de resultados."""
+
+    def test_expiry(self):
+        """Prueba que las entradas expiren tras el TTL."""
+        cache = ResultCache(ttl=0.01)
+        cache.put(("dev", "SELECT 1"), "1")
+        assert cache.get(("dev", "SELECT 1")) == "1"
+        time.sleep(0.02)
+        assert cache.get(("dev", "SELECT 1")) is None
+
+    def test_lru_eviction(self):
+        """Prueba que se descarte la entrada menos usada al superar el límite."""
+        cache = ResultCache(ttl=60, max_entries=2)
+        cache.put(("dev", "a"), "a")
+        cache.put(("dev", "b"), "b")
+        cache.get(("dev", "a"))
+        cache.put(("dev", "c"), "c")
+        assert cache.get(("dev", "a")) == "a"
+        assert cache.get(("dev", "b")) is None
+
+    def test_disabled(self):
+        """Prueba que un TTL de 0 desactive el caché."""
+        cache = ResultCache(ttl=0)
+        cache.put(("dev", "a"), "a")
+        assert cache.get(("dev", "a")) is None
+
+
+class TestGatewayBroker:
+    """Casos de prueba para la ejecución a través del broker."""
+
+    def test_cacheable_reads_hit_cache(self, broker):
+        """Prueba que las lecturas cacheables no repitan la consulta."""
+        first = broker.execute("SELECT 1", cacheable=True)
+        second = broker.execute("SELECT 1", target="ha", cacheable=True)
+        assert first == second == ("salida 1", "")
+        assert len(broker.conn.commands) == 1
+
+    def test_uncached_reads(self, broker):
+        """Prueba que las lecturas no cacheables siempre se ejecuten."""
+        broker.execute("DSPSYSSTS")
+        broker.execute("DSPSYSSTS")
+        assert len(broker.conn.commands) == 2
+
+    def test_write_invalidates_cache(self, broker):
+        """Prueba que una compilación invalide el caché de catálogo."""
+        broker.execute("SELECT 1", cacheable=True)
+        broker.execute("CRTBNDRPG PGM(L/P)", write=True)
+        broker.execute("SELECT 1", cacheable=True)
+        assert len(broker.conn.commands) == 3
+
+    def test_system_commands_stay_on_default(self, broker):
+        """Prueba que solo las consultas de catálogo y fuentes vayan a la réplica."""
+        broker.router.health["dev"].latency = 0.050
+        broker.router.health["ha"].latency = 0.010
+
+        broker.execute("WRKACTJOB")
+        broker.execute("SELECT * FROM QSYS2.ACTIVE_JOB_INFO")
+        broker.execute("SELECT 1", balanced=True)
+        broker.execute("DSPSYSSTS", target="ha")
+        assert broker.conn.systems == ["dev", "dev", "ha", "ha"]
+
+    def test_write_to_replica_rejected(self, broker):
+        """Prueba que el broker no envíe escrituras a una réplica."""
+        with pytest.raises(ValueError):
+            broker.execute("CRTBNDRPG PGM(L/P)", target="ha", write=True)
+        assert broker.conn.commands == []
+
+
+class TestBrokerConfig:
+    """Casos de prueba para la configuración del broker externo."""
+
+    def test_address_requires_authkey(self, monkeypatch):
+        """Prueba que una dirección sin clave impida arrancar."""
+        monkeypatch.setenv(BROKER_ADDRESS_ENV, "broker.local:9000")
+        monkeypatch.setenv(BROKER_AUTHKEY_ENV, "")
+        with pytest.raises(ValueError):
+            BrokerConfig.from_env().validate()
+
+    def test_invalid_values(self, monkeypatch):
+        """Prueba que se rechacen direcciones sin puerto y claves no hexadecimales o cortas."""
+        monkeypatch.setenv(BROKER_ADDRESS_ENV, "broker.local")
+        with pytest.raises(ValueError):
+            BrokerConfig.from_env()
+
+        monkeypatch.setenv(BROKER_ADDRESS_ENV, "broker.local:9000")
+        monkeypatch.setenv(BROKER_AUTHKEY_ENV, "no-es-hex")
+        with pytest.raises(ValueError):
+            BrokerConfig.from_env()
+
+        monkeypatch.setenv(BROKER_AUTHKEY_ENV, "abcd")
+        with pytest.raises(ValueError):
+            BrokerConfig.from_env().validate()
+
+    def test_valid_config(self, monkeypatch):
+        """Prueba una dirección y clave válidas."""
+        monkeypatch.setenv(BROKER_ADDRESS_ENV, "broker.local:9000")
+        monkeypatch.setenv(BROKER_AUTHKEY_ENV, "ab" * 16)
+        config = BrokerConfig.from_env()
+        config.validate()
+        assert config.address == ("broker.local", 9000)
+        assert config.authkey == bytes.fromhex("ab" * 16)
+
+    def test_get_broker_without_authkey(self, monkeypatch):
+        """Prueba que get_broker() falle como error de configuración y no al llamar."""
+        monkeypatch.setenv(BROKER_ADDRESS_ENV, "127.0.0.1:9")
+        monkeypatch.setenv(BROKER_AUTHKEY_ENV, "")
+        monkeypatch.setattr(broker_module, "_remote", None)
+        with pytest.raises(ValueError):
+            get_broker()
+
+
+def install_stub_broker():
+    """Inicializador del proceso broker: instala un broker sin SSH real."""
+    targets = {
+        "dev": IBMiConfig(host="dev.invalid", user="u", password="p", name="dev"),
+        "ha": IBMiConfig(host="ha.invalid", user="u", password="p", name="ha", replica_of="dev"),
+    }
+    stub = GatewayBroker(GatewayConfig(targets=targets, default_target="dev"), cache_ttl=60)
+    stub.router.stop()
+    conn = FakeConnection()
+
+    def execute(name, command):
+        if name == "ha":
+            raise CircuitOpenError("Conexión fallida: ha.invalid:22 no disponible (circuito abierto)")
+        return conn.execute(command)
+
+    stub.router.execute = execute
+    broker_module._broker = stub
+
+
+@pytest.fixture
+def shared_broker(monkeypatch):
+    """Broker en un proceso aparte, accesible vía IBMI_BROKER_ADDRESS."""
+    monkeypatch.setenv(BROKER_ADDRESS_ENV, "")
+    monkeypatch.setenv(BROKER_AUTHKEY_ENV, "")
+    monkeypatch.setattr(broker_module, "_remote", None)
+    supervisor = start_broker(initializer=install_stub_broker)
+    supervisor.interval = 0.05
+    yield supervisor
+    supervisor.shutdown()
+
+
+class TestSharedBroker:
+    """Casos de prueba para el broker compartido entre procesos."""
+
+    def test_execute_through_proxy(self, shared_broker):
+        """Prueba que get_broker() use el proceso broker vía proxy."""
+        broker = get_broker()
+        assert not isinstance(broker, GatewayBroker)
+        assert broker.execute("SELECT 1", None, False, True, True) == ("salida 1", "")
+        assert any(line.startswith("dev (por defecto)") for line in broker.status())
+
+    def test_second_proxy_shares_cache(self, shared_broker):
+        """Prueba que otro proceso cliente vea el mismo caché."""
+        get_broker().execute("SELECT 1", None, False, True, True)
+
+        host, _, port = os.environ[BROKER_ADDRESS_ENV].rpartition(":")
+        manager = BrokerManager(address=(host, int(port)), authkey=bytes.fromhex(os.environ[BROKER_AUTHKEY_ENV]))
+        manager.connect()
+        other = manager.broker()
+
+        assert other.execute("SELECT 1", None, False, True, True) == ("salida 1", "")
+        assert other.execute("DSPSYSSTS") == ("salida 2", "")
+
+    def test_errors_keep_their_type(self, shared_broker):
+        """Prueba que ValueError y CircuitOpenError crucen el proxy intactos."""
+        broker = get_broker()
+        with pytest.raises(ValueError):
+            broker.execute("DSPSYSSTS", "prod")
+        with pytest.raises(CircuitOpenError):
+            broker.execute("DSPSYSSTS", "ha")
+
+    def test_wrong_authkey(self, shared_broker, monkeypatch):
+        """Prueba que una clave incorrecta dé un error de conexión claro."""
+        monkeypatch.setenv(BROKER_AUTHKEY_ENV, "00" * 16)
+        monkeypatch.setattr(broker_module, "_remote", None)
+        with pytest.raises(ConnectionError, match="IBMI_BROKER_AUTHKEY"):
+            get_broker().status()
+
+    def test_reconnects_after_broker_restart(self, shared_broker):
+        """Prueba que los workers se reconecten si el broker muere y se relanza."""
+        broker = get_broker()
+        assert broker.execute("DSPSYSSTS") == ("salida 1", "")
+
+        shared_broker.process.kill()
+        deadline = time.monotonic() + 10
+        while shared_broker.restarts == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert shared_broker.restarts == 1
+
+        # Broker nuevo: mismo acceso, contador y caché reiniciados
+        assert broker.execute("DSPSYSSTS") == ("salida 1", "")
+
+    def test_write_not_retried_after_broker_restart(self, shared_broker):
+        """Prueba que una compilación no se repita si la conexión se pierde tras enviarla."""
+        broker = get_broker()
+        assert broker.execute("DSPSYSSTS") == ("salida 1", "")
+
+        shared_broker.process.kill()
+        deadline = time.monotonic() + 10
+        while shared_broker.restarts == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        with pytest.raises(ConnectionError):
+            broker.execute("CRTBNDRPG PGM(L/P)", None, True)
+
+        # El proxy roto se descartó: la siguiente llamada se reconecta y el
+        # broker nuevo no recibió la compilación
+        assert broker.execute("DSPSYSSTS") == ("salida 1", "")
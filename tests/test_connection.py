@@ -0,0 +1,88 @@
+"""
+Pruebas unitarias para la ejecución de comandos por SSH.
+Author: Santiago Pernia
+"""
+
+import socket
+import paramiko
+import pytest
+from ibmi_gateway.config import IBMiConfig
+from ibmi_gateway.connection import IBMiConnection, SessionLostError
+
+
+class HungStream:
+    """Stream de un canal SSH cuyo comando nunca termina."""
+
+    def read(self):
+        raise socket.timeout("timed out")
+
+
+class HungChannel:
+    """Canal SSH simulado que registra el timeout pedido."""
+
+    def __init__(self):
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def exec_command(self, command):
+        pass
+
+    def makefile(self, mode):
+        return HungStream()
+
+    def makefile_stderr(self, mode):
+        return HungStream()
+
+
+class FakeTransport:
+    """Transporte SSH simulado; `channel` None simula una sesión muerta."""
+
+    def __init__(self, channel=None):
+        self.channel = channel
+        self.open_timeout = None
+
+    def is_active(self):
+        return True
+
+    def open_session(self, timeout=None):
+        self.open_timeout = timeout
+        if self.channel is None:
+            raise paramiko.SSHException("Timeout opening channel.")
+        return self.channel
+
+
+class FakeClient:
+    """Cliente SSH simulado."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def get_transport(self):
+        return self.transport
+
+
+class TestCommandTimeout:
+    """Casos de prueba para el timeout de comandos."""
+
+    def test_hung_command_times_out(self):
+        """Prueba que un comando colgado lance TimeoutError en lugar de bloquear."""
+        config = IBMiConfig(host="h", user="u", password="p", command_timeout=7)
+        conn = IBMiConnection(config)
+        channel = HungChannel()
+        conn.client = FakeClient(FakeTransport(channel))
+
+        with pytest.raises(TimeoutError):
+            conn.execute("DSPSYSSTS")
+        assert channel.timeout == 7
+
+    def test_dead_session_fails_before_command(self):
+        """Prueba que una sesión muerta falle al abrir el canal con ssh_timeout."""
+        config = IBMiConfig(host="h", user="u", password="p", ssh_timeout=5)
+        conn = IBMiConnection(config)
+        conn.client = FakeClient(FakeTransport())
+
+        with pytest.raises(SessionLostError):
+            conn.execute("DSPSYSSTS")
+        assert conn.client.transport.open_timeout == 5
@@ -0,0 +1,70 @@
+"""
+Pruebas unitarias para la seguridad del modo HTTP.
+Author: Santiago Pernia
+"""
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from ibmi_gateway.config import HttpConfig
+from ibmi_gateway.http_security import BearerTokenMiddleware, transport_security
+
+
+def make_client(token: str) -> TestClient:
+    """Cliente de prueba para una aplicación protegida con token."""
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/mcp", ok, methods=["POST"])])
+    return TestClient(BearerTokenMiddleware(app, token))
+
+
+class TestHttpConfig:
+    """Casos de prueba para la validación de la configuración HTTP."""
+
+    def test_loopback_without_token(self):
+        """Prueba que en local no se exija token."""
+        HttpConfig(host="127.0.0.1").validate()
+
+    def test_remote_requires_token(self):
+        """Prueba que escuchar en la red sin token impida arrancar."""
+        with pytest.raises(ValueError):
+            HttpConfig(host="0.0.0.0", allowed_hosts=("gw:*",)).validate()
+
+    def test_remote_requires_allowed_hosts(self):
+        """Prueba que escuchar en la red exija la lista de hosts permitidos."""
+        with pytest.raises(ValueError):
+            HttpConfig(host="0.0.0.0", token="secreto").validate()
+
+    def test_remote_with_token_and_hosts(self):
+        """Prueba una configuración de red válida y sus hosts permitidos."""
+        config = HttpConfig(host="0.0.0.0", token="secreto", allowed_hosts=("gw.local:*",))
+        config.validate()
+
+        settings = transport_security(config)
+        assert settings.enable_dns_rebinding_protection is True
+        assert "gw.local:*" in settings.allowed_hosts
+        assert "localhost:*" in settings.allowed_hosts
+
+
+class TestBearerTokenMiddleware:
+    """Casos de prueba para la autenticación por token."""
+
+    def test_missing_token_rejected(self):
+        """Prueba que una petición sin token reciba 401."""
+        response = make_client("secreto").post("/mcp")
+        assert response.status_code == 401
+        assert response.headers["www-authenticate"] == "Bearer"
+
+    def test_wrong_token_rejected(self):
+        """Prueba que un token incorrecto reciba 401."""
+        response = make_client("secreto").post("/mcp", headers={"Authorization": "Bearer otro"})
+        assert response.status_code == 401
+
+    def test_valid_token_accepted(self):
+        """Prueba que el token correcto llegue a la aplicación."""
+        response = make_client("secreto").post("/mcp", headers={"Authorization": "Bearer secreto"})
+        assert response.status_code == 200
+        assert response.text == "ok"
@@ -0,0 +1,95 @@
+"""
+Pruebas unitarias para la reutilización de sesiones del pool SSH.
+Author: Santiago Pernia
+"""
+
+import time
+import pytest
+from ibmi_gateway.config import IBMiConfig
+from ibmi_gateway.connection import IBMiConnection, SessionLostError
+from ibmi_gateway.pool import ConnectionPool
+
+
+class StaleConnection:
+    """Sesión ociosa que un firewall cortó sin avisar."""
+
+    def __init__(self):
+        self.closed = False
+        self.commands = []
+
+    def is_active(self):
+        return True
+
+    def execute(self, command):
+        self.commands.append(command)
+        raise SessionLostError("La sesión SSH no responde: Timeout opening channel.")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fresh_connections(monkeypatch):
+    """Las conexiones nuevas conectan sin red y registran sus comandos."""
+    opened = []
+
+    def connect(self):
+        opened.append(self)
+
+    def execute(self, command):
+        return f"{command} ok", ""
+
+    monkeypatch.setattr(IBMiConnection, "connect", connect)
+    monkeypatch.setattr(IBMiConnection, "execute", execute)
+    monkeypatch.setattr(IBMiConnection, "is_active", lambda self: True)
+    return opened
+
+
+def make_pool(host: str, **kwargs) -> ConnectionPool:
+    """Pool contra un host ficticio."""
+    return ConnectionPool(IBMiConfig(host=host, user="u", password="p", **kwargs))
+
+
+class TestStaleSessions:
+    """Casos de prueba para sesiones ociosas caducadas."""
+
+    def test_stale_session_retried_on_new_connection(self, fresh_connections):
+        """Prueba que una sesión muerta se descarte y el comando se repita en una nueva."""
+        pool = make_pool("stale.invalid")
+        stale = StaleConnection()
+        pool._idle.append((stale, time.monotonic()))
+
+        assert pool.execute("DSPSYSSTS") == ("DSPSYSSTS ok", "")
+        assert stale.closed
+        assert stale.commands == ["DSPSYSSTS"]
+        assert len(fresh_connections) == 1
+
+        # La conexión nueva queda en el pool para la siguiente llamada
+        assert pool.execute("WRKACTJOB") == ("WRKACTJOB ok", "")
+        assert len(fresh_connections) == 1
+
+    def test_new_connection_not_retried(self, fresh_connections, monkeypatch):
+        """Prueba que el fallo de una conexión recién abierta no se reintente."""
+        calls = []
+
+        def lost(self, command):
+            calls.append(command)
+            raise SessionLostError("La sesión SSH no responde: EOF")
+
+        monkeypatch.setattr(IBMiConnection, "execute", lost)
+        pool = make_pool("lost.invalid")
+
+        with pytest.raises(SessionLostError):
+            pool.execute("DSPSYSSTS")
+        assert calls == ["DSPSYSSTS"]
+
+    def test_old_idle_session_evicted(self, fresh_connections):
+        """Prueba que una sesión ociosa más allá de pool_max_idle no se reutilice."""
+        pool = make_pool("idle.invalid", pool_max_idle=60)
+        old = StaleConnection()
+        pool._idle.append((old, time.monotonic() - 61))
+
+        assert pool.execute("DSPSYSSTS") == ("DSPSYSSTS ok", "")
+        assert old.closed
+        assert old.commands == []
+        assert len(fresh_connections) == 1
@@ -0,0 +1,127 @@
+"""
+Pruebas unitarias para configuración multi-sistema y enrutamiento.
+Author: Santiago Pernia
+"""
+
+import pytest
+from ibmi_gateway.config import GatewayConfig, IBMiConfig
+from ibmi_gateway.router import TargetRouter
+
+
+def make_config(health_failures: int = 2) -> GatewayConfig:
+    """Construye una configuración con dev, test y una réplica HA de dev."""
+    targets = {
+        "dev": IBMiConfig(host="dev.local", user="u", password="p", name="dev"),
+        "test": IBMiConfig(host="test.local", user="u", password="p", name="test"),
+        "ha": IBMiConfig(host="ha.local", user="u", password="p", name="ha", replica_of="dev"),
+    }
+    return GatewayConfig(targets=targets, default_target="dev", health_failures=health_failures)
+
+
+class FakeProbe:
+    """Sondeo simulado con latencias configurables por host."""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def __call__(self, config: IBMiConfig) -> float:
+        latency = self.latencies[config.host]
+        if latency is None:
+            raise OSError("timed out")
+        return latency
+
+
+class TestGatewayConfig:
+    """Casos de prueba para la carga de configuración multi-sistema."""
+
+    def test_single_host_fallback(self, monkeypatch):
+        """Prueba que sin IBMI_TARGETS se use un único sistema 'default'."""
+        monkeypatch.delenv("IBMI_TARGETS", raising=False)
+        monkeypatch.setenv("IBMI_HOST", "host.local")
+        monkeypatch.setenv("IBMI_USER", "u")
+        monkeypatch.setenv("IBMI_PASS", "p")
+
+        config = GatewayConfig.from_env()
+
+        assert list(config.targets) == ["default"]
+        assert config.default_target == "default"
+        assert config.targets["default"].host == "host.local"
+
+    def test_named_targets(self, monkeypatch):
+        """Prueba la carga de varios sistemas con credenciales heredadas."""
+        monkeypatch.setenv("IBMI_TARGETS", "DEV, HA")
+        monkeypatch.setenv("IBMI_USER", "u")
+        monkeypatch.setenv("IBMI_PASS", "p")
+        monkeypatch.setenv("IBMI_DEV_HOST", "dev.local")
+        monkeypatch.setenv("IBMI_HA_HOST", "ha.local")
+        monkeypatch.setenv("IBMI_HA_REPLICA_OF", "DEV")
+        monkeypatch.delenv("IBMI_DEFAULT_TARGET", raising=False)
+
+        config = GatewayConfig.from_env()
+
+        assert list(config.targets) == ["dev", "ha"]
+        assert config.default_target == "dev"
+        assert config.targets["ha"].read_only is True
+        assert config.targets["ha"].user == "u"
+
+    def test_unknown_replica_source(self, monkeypatch):
+        """Prueba que una réplica de un sistema inexistente sea rechazada."""
+        monkeypatch.setenv("IBMI_TARGETS", "ha")
+        monkeypatch.setenv("IBMI_USER", "u")
+        monkeypatch.setenv("IBMI_PASS", "p")
+        monkeypatch.setenv("IBMI_HA_HOST", "ha.local")
+        monkeypatch.setenv("IBMI_HA_REPLICA_OF", "prod")
+
+        with pytest.raises(ValueError):
+            GatewayConfig.from_env()
+
+
+class TestTargetRouter:
+    """Casos de prueba para la selección de sistemas."""
+
+    def test_write_rejects_replica(self):
+        """Prueba que las réplicas de solo lectura no acepten escrituras."""
+        router = TargetRouter(make_config())
+        assert router.select_write() == "dev"
+        assert router.select_write("TEST") == "test"
+        with pytest.raises(ValueError):
+            router.select_write("ha")
+
+    def test_unknown_target(self):
+        """Prueba que un sistema desconocido produzca un error."""
+        router = TargetRouter(make_config())
+        with pytest.raises(ValueError):
+            router.select_read("prod")
+
+    def test_read_prefers_default_before_probing(self):
+        """Prueba que sin mediciones se use el sistema por defecto."""
+        router = TargetRouter(make_config())
+        assert router.select_read() == "dev"
+
+    def test_read_routes_to_fastest_replica(self):
+        """Prueba que las lecturas vayan a la réplica sana más rápida."""
+        probe = FakeProbe({"dev.local": 0.050, "test.local": 0.001, "ha.local": 0.010})
+        router = TargetRouter(make_config(), probe=probe)
+        router.check_all()
+
+        # 'test' es más rápido pero no replica a 'dev'
+        assert router.select_read() == "ha"
+        assert router.select_read("test") == "test"
+
+    def test_unhealthy_replica_is_ejected(self):
+        """Prueba que un sistema caído sea expulsado tras varios fallos."""
+        probe = FakeProbe({"dev.local": 0.050, "test.local": 0.001, "ha.local": 0.010})
+        router = TargetRouter(make_config(health_failures=2), probe=probe)
+        router.check_all()
+
+        probe.latencies["ha.local"] = None
+        router.check_all()
+        assert router.health["ha"].healthy is True
+
+        router.check_all()
+        assert router.health["ha"].healthy is False
+        assert router.select_read() == "dev"
+
+        probe.latencies["ha.local"] = 0.010
+        router.check_all()
+        assert router.select_read() == "ha"